@@ -11,17 +11,144 @@ Example:
 from __future__ import annotations
 
 import argparse
+import array
+import base64
+import bisect
+import collections
+import concurrent.futures
+import contextlib
+import dataclasses
 import datetime as dt
+import gzip
+import heapq
+import http.client
+import io
+import itertools
 import json
+import os
 import sys
 import urllib.error
 import urllib.parse
 import urllib.request
-from typing import Optional
+from typing import Iterable, Iterator, Optional
+
+try:  # optional: orjson parses bytes directly and is several times faster
+    import orjson as _json
+except ImportError:  # pragma: no cover - stdlib fallback
+    _json = json
 
 
 LICHESS_API_BASE = "https://lichess.org/api/games/user"
 LICHESS_USER_BASE = "https://lichess.org/api/user"
+LICHESS_PUZZLE_ACTIVITY = "https://lichess.org/api/puzzle/activity"
+LICHESS_HOST = "lichess.org"
+_MAX_REDIRECTS = 10  # same limit as urllib's HTTPRedirectHandler
+_REDIRECT_CODES = frozenset({301, 302, 303, 307, 308})
+
+_DRAW_STATUSES = frozenset(
+    {
+        "draw",
+        "stalemate",
+        "repetition",
+        "50move",
+        "timevsinsufficientmaterial",
+        "insufficientmaterial",
+        "agreed",
+    }
+)
+_ENDINGS = ("mate", "resign", "stalemate", "timeout", "outoftime", "aborted", "draw", "other")
+_OTHER_ENDING = _ENDINGS.index("other")
+_NO_ENDING = -1  # games without a status are not counted as an ending
+_STATUS_TO_ENDING = {status: i for i, status in enumerate(_ENDINGS)}
+_STATUS_TO_ENDING[""] = _NO_ENDING
+_TIMEOUT_ENDINGS = frozenset({_STATUS_TO_ENDING["timeout"], _STATUS_TO_ENDING["outoftime"]})
+_SPEEDS = ("bullet", "blitz", "rapid", "classical")
+_SPEED_IDS = {speed: i for i, speed in enumerate(_SPEEDS)}
+_OTHER_SPEED = len(_SPEEDS)
+_COLOR_IDS = {"white": 0, "black": 1}
+_NO_COLOR = -1
+_OUTCOME_CODES = {"win": 1, "loss": -1, "draw": 0}
+_NO_OUTCOME = 2
+_BATCH_SIZE = 5000  # NDJSON lines per parse batch / worker task
+_HIST_BUCKETS = 40  # 100-point opponent rating buckets; the last one also holds 3900+
+
+# dataclass(slots=True) needs Python 3.10+; older interpreters get regular dataclasses.
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclasses.dataclass(**_SLOTS)
+class SpeedCounts:
+    bullet: int = 0
+    blitz: int = 0
+    rapid: int = 0
+    classical: int = 0
+
+
+@dataclasses.dataclass(**_SLOTS)
+class Results:
+    win: int = 0
+    loss: int = 0
+    draw: int = 0
+
+
+@dataclasses.dataclass(**_SLOTS)
+class ColorResults:
+    white: Results = dataclasses.field(default_factory=Results)
+    black: Results = dataclasses.field(default_factory=Results)
+
+
+@dataclasses.dataclass(**_SLOTS)
+class Endings:
+    """Game endings by status; field order matches _ENDINGS."""
+
+    mate: int = 0
+    resign: int = 0
+    stalemate: int = 0
+    timeout: int = 0
+    outoftime: int = 0
+    aborted: int = 0
+    draw: int = 0
+    other: int = 0
+
+
+@dataclasses.dataclass(**_SLOTS)
+class RatingTotal:
+    sum: int = 0
+    count: int = 0
+
+
+@dataclasses.dataclass(**_SLOTS)
+class OpponentBySpeed:
+    bullet: RatingTotal = dataclasses.field(default_factory=RatingTotal)
+    blitz: RatingTotal = dataclasses.field(default_factory=RatingTotal)
+    rapid: RatingTotal = dataclasses.field(default_factory=RatingTotal)
+    classical: RatingTotal = dataclasses.field(default_factory=RatingTotal)
+
+
+@dataclasses.dataclass(**_SLOTS)
+class GameStats:
+    """Aggregate counts for one user's games in one year, as returned by fetch_game_stats."""
+
+    total: int = 0
+    speed_counts: SpeedCounts = dataclasses.field(default_factory=SpeedCounts)
+    other_speeds: int = 0
+    results: Results = dataclasses.field(default_factory=Results)
+    color_results: ColorResults = dataclasses.field(default_factory=ColorResults)
+    endings: Endings = dataclasses.field(default_factory=Endings)
+    timeout_wins: int = 0
+    timeout_losses: int = 0
+    opponent_rating_sum: int = 0
+    opponent_rating_count: int = 0
+    opponent_by_speed: OpponentBySpeed = dataclasses.field(default_factory=OpponentBySpeed)
+    opponent_hist: dict[int, int] = dataclasses.field(default_factory=dict)
+    # (rating, name, game_id) of the three highest rated wins, best first
+    top_wins: list[tuple[int, str, object]] = dataclasses.field(default_factory=list)
+    month_counts: list[int] = dataclasses.field(default_factory=lambda: [0] * 12)
+    wday_counts: list[int] = dataclasses.field(default_factory=lambda: [0] * 7)
+    hour_counts: list[int] = dataclasses.field(default_factory=lambda: [0] * 24)
+    longest_win_streak: int = 0
+    longest_loss_streak: int = 0
+    longest_gap_ms: int = 0
 
 
 def _year_bounds_ms(year: int) -> tuple[int, int]:
@@ -31,7 +158,270 @@ def _year_bounds_ms(year: int) -> tuple[int, int]:
     return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
 
 
-def fetch_game_stats(username: str, year: int, token: Optional[str] = None) -> dict:
+def _month_starts_ms(year: int) -> list[int]:
+    """Return the UTC start of each month of the year plus the next year's start, in ms."""
+    starts = [dt.datetime(year, month, 1, tzinfo=dt.timezone.utc) for month in range(1, 13)]
+    starts.append(dt.datetime(year + 1, 1, 1, tzinfo=dt.timezone.utc))
+    return [int(start.timestamp() * 1000) for start in starts]
+
+
+def _longest_streaks(outcomes: Iterable[int]) -> tuple[int, int]:
+    """Return the longest (win, loss) runs in a chronological sequence of outcome codes."""
+    longest = {1: 0, -1: 0, 0: 0}
+    for code, run in itertools.groupby(outcomes):
+        length = sum(1 for _ in run)
+        if length > longest[code]:
+            longest[code] = length
+    return longest[1], longest[-1]
+
+
+_connection: Optional[http.client.HTTPSConnection] = None
+
+
+def _lichess_connection() -> http.client.HTTPSConnection:
+    """Return the shared keep-alive connection to Lichess, honouring an HTTPS proxy."""
+    global _connection
+    if _connection is None:
+        proxy = urllib.request.getproxies().get("https")
+        if proxy and not urllib.request.proxy_bypass(LICHESS_HOST):
+            if "://" not in proxy:
+                proxy = f"http://{proxy}"
+            parts = urllib.parse.urlsplit(proxy)
+            tunnel_headers = {}
+            if parts.username is not None:
+                # Same credentials urllib's ProxyHandler would have sent.
+                user_pass = (
+                    f"{urllib.parse.unquote(parts.username)}:"
+                    f"{urllib.parse.unquote(parts.password or '')}"
+                )
+                creds = base64.b64encode(user_pass.encode()).decode("ascii")
+                tunnel_headers["Proxy-Authorization"] = f"Basic {creds}"
+            _connection = http.client.HTTPSConnection(parts.hostname, parts.port)
+            _connection.set_tunnel(LICHESS_HOST, headers=tunnel_headers)
+        else:
+            _connection = http.client.HTTPSConnection(LICHESS_HOST)
+    return _connection
+
+
+def _lichess_request(target: str, headers: dict[str, str]) -> http.client.HTTPResponse:
+    """Send one GET over the shared connection, reconnecting once if the server dropped it."""
+    conn = _lichess_connection()
+    reused = conn.sock is not None
+    try:
+        conn.request("GET", target, headers=headers)
+        return conn.getresponse()
+    except (ConnectionResetError, BrokenPipeError):  # includes RemoteDisconnected
+        conn.close()
+        if not reused:
+            raise
+    # The server closed the idle keep-alive connection (timeout or request cap); retry fresh.
+    conn.request("GET", target, headers=headers)
+    return conn.getresponse()
+
+
+@contextlib.contextmanager
+def _lichess_get(url: str, headers: dict[str, str]) -> Iterator[http.client.HTTPResponse]:
+    """Open a Lichess URL with _lichess_open and close the response on exit.
+
+    If the block exits before the body was read to the end, the unread bytes would be parsed
+    as the next response's status line, so the shared connection is dropped instead.
+    """
+    response = _lichess_open(url, headers)
+    try:
+        yield response
+    finally:
+        if not response.isclosed():
+            _lichess_connection().close()  # the next request reconnects
+        response.close()
+
+
+def _lichess_open(url: str, headers: dict[str, str]) -> http.client.HTTPResponse:
+    """GET a Lichess URL over the shared connection so the TLS session is reused.
+
+    Redirects are followed like urllib.request.urlopen does; ones leaving lichess.org are
+    handed to urlopen itself. Failures are raised as urllib.error.HTTPError / URLError.
+    """
+    for _ in range(_MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme != "https" or parts.hostname != LICHESS_HOST:
+            off_site = {k: v for k, v in headers.items() if k != "Authorization"}
+            return urllib.request.urlopen(urllib.request.Request(url, headers=off_site))
+        target = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        try:
+            response = _lichess_request(target, headers)
+        except (OSError, http.client.HTTPException) as exc:
+            _lichess_connection().close()  # the next request reconnects
+            raise urllib.error.URLError(exc) from exc
+        location = response.headers.get("Location")
+        if response.status in _REDIRECT_CODES and location:
+            response.read()  # drain so the connection can be reused
+            url = urllib.parse.urljoin(url, location)
+            continue
+        if response.status != 200:
+            response.read()
+            raise urllib.error.HTTPError(
+                url, response.status, response.reason, response.headers, None
+            )
+        return response
+    raise urllib.error.HTTPError(
+        url, response.status, "Too many redirects", response.headers, None
+    )
+
+
+def _decoded_body(response):
+    """Return a file object over the response body, transparently un-gzipping it."""
+    if response.headers.get("Content-Encoding", "").lower() == "gzip":
+        return gzip.GzipFile(fileobj=response)
+    return response
+
+
+def _iter_ndjson_lines(response, chunk_size: int = 1 << 16):
+    """Yield non-blank NDJSON lines as bytes, reading the response in fixed-size chunks."""
+    partial = b""
+    while True:
+        buf = response.read(chunk_size)
+        if not buf:
+            break
+        lines = (partial + buf).split(b"\n")
+        partial = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if partial.strip():
+        yield partial
+
+
+def _push_top_win(heap: list, entry: tuple[int, int, str, object]) -> None:
+    """Keep the three highest rated wins in a min-heap of (rating, -seq, name, game_id)."""
+    if len(heap) < 3:
+        heapq.heappush(heap, entry)
+    elif entry[:2] > heap[0][:2]:  # (rating, -seq): ties keep the earlier game
+        heapq.heapreplace(heap, entry)
+
+
+def _new_columns() -> dict:
+    """Return empty per-game columns, keyed like _aggregate's parameters, plus the top-wins heap.
+
+    _parse_games fills one set per batch and fetch_game_stats merges them into another,
+    so both sides always agree on the fields and their typecodes.
+    """
+    return {
+        "speed_ids": array.array("b"),
+        "color_ids": array.array("b"),
+        "outcome_ids": array.array("b"),
+        "ending_ids": array.array("b"),
+        "opp_ratings": array.array("i"),
+        "ts_ms": array.array("q"),
+        "top_wins": [],  # min-heap of (rating, -seq, name, game_id)
+    }
+
+
+def _parse_games(lines: list[bytes], username_lower: str, first_seq: int = 0) -> dict:
+    """Parse a batch of NDJSON game lines into per-game columns for _aggregate.
+
+    Runs in worker processes for large downloads, so it only returns picklable values.
+    """
+    columns = _new_columns()
+    speed_ids = columns["speed_ids"]
+    color_ids = columns["color_ids"]
+    outcome_ids = columns["outcome_ids"]
+    ending_ids = columns["ending_ids"]
+    opp_ratings = columns["opp_ratings"]
+    ts_ms = columns["ts_ms"]
+    top_wins_heap = columns["top_wins"]
+    seq = first_seq
+    for raw_line in lines:
+        seq += 1
+        try:
+            game = _json.loads(raw_line)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            continue  # skip malformed lines while keeping total count
+
+        ts = game.get("createdAt") or game.get("lastMoveAt")
+        ts_ms.append(ts if isinstance(ts, int) else 0)
+        speed_ids.append(_SPEED_IDS.get(game.get("speed"), _OTHER_SPEED))
+
+        players = game.get("players", {})
+        white = players.get("white", {})
+        black = players.get("black", {})
+        user_color = None
+        opp_player = None
+        # Lichess user ids are already lowercase, so no per-game .lower() is needed,
+        # and the black id is only looked up when the user is not white.
+        if (white.get("user") or {}).get("id") == username_lower:
+            user_color = "white"
+            opp_player = black
+        elif (black.get("user") or {}).get("id") == username_lower:
+            user_color = "black"
+            opp_player = white
+
+        status = sys.intern(str(game.get("status", "")).lower())
+        ending_ids.append(_STATUS_TO_ENDING.get(status, _OTHER_ENDING))
+        winner = game.get("winner")
+
+        is_draw_status = status in _DRAW_STATUSES
+
+        if not user_color:
+            color_ids.append(_NO_COLOR)
+            outcome_ids.append(_NO_OUTCOME)
+            opp_ratings.append(0)
+            continue
+
+        if winner == user_color:
+            outcome = "win"
+        elif winner in ("white", "black"):
+            outcome = "loss"
+        elif is_draw_status or winner is None:
+            outcome = "draw"
+        else:
+            outcome = "draw"
+        color_ids.append(_COLOR_IDS[user_color])
+        outcome_ids.append(_OUTCOME_CODES[outcome])
+
+        opp_rating = opp_player.get("rating")
+        if not isinstance(opp_rating, int):
+            opp_ratings.append(0)
+            continue
+        opp_ratings.append(opp_rating)
+        if outcome == "win":
+            opp_name = (opp_player.get("user") or {}).get("name") or "?"
+            _push_top_win(top_wins_heap, (opp_rating, -seq, opp_name, game.get("id")))
+
+    return {"total": len(lines), **columns}
+
+
+def _parse_in_batches(lines, username_lower: str, batch_size: int = _BATCH_SIZE):
+    """Yield _parse_games results in stream order.
+
+    The first batch is parsed inline so small downloads never pay for process start-up;
+    later batches are handed to a process pool while the download continues.
+    """
+    batches = iter(lambda: list(itertools.islice(lines, batch_size)), [])
+    batch = next(batches, [])
+    if not batch:
+        return
+    yield _parse_games(batch, username_lower)
+    first_seq = len(batch)
+
+    workers = os.cpu_count() or 1
+    if workers < 2:
+        for batch in batches:
+            yield _parse_games(batch, username_lower, first_seq)
+            first_seq += len(batch)
+        return
+
+    pending: collections.deque = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in batches:
+            pending.append(pool.submit(_parse_games, batch, username_lower, first_seq))
+            first_seq += len(batch)
+            while pending and pending[0].done():
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def fetch_game_stats(username: str, year: int, token: Optional[str] = None) -> GameStats:
     """Stream all games for the user in the given year and return aggregate counts."""
     since_ms, until_ms = _year_bounds_ms(year)
     query = {
@@ -46,178 +436,125 @@ def fetch_game_stats(username: str, year: int, token: Optional[str] = None) -> d
     }
     url = f"{LICHESS_API_BASE}/{urllib.parse.quote(username)}?{urllib.parse.urlencode(query)}"
 
-    request = urllib.request.Request(url)
-    request.add_header("Accept", "application/x-ndjson")
+    headers = {"Accept": "application/x-ndjson", "Accept-Encoding": "gzip"}
     if token:
-        request.add_header("Authorization", f"Bearer {token}")
-
-    stats: dict[str, object] = {
-        "total": 0,
-        "speed_counts": {"bullet": 0, "blitz": 0, "rapid": 0, "classical": 0},
-        "other_speeds": 0,
-        "results": {"win": 0, "loss": 0, "draw": 0},
-        "color_results": {
-            "white": {"win": 0, "loss": 0, "draw": 0},
-            "black": {"win": 0, "loss": 0, "draw": 0},
-        },
-        "endings": {
-            "mate": 0,
-            "resign": 0,
-            "stalemate": 0,
-            "timeout": 0,
-            "outoftime": 0,
-            "aborted": 0,
-            "draw": 0,
-            "other": 0,
-        },
-        "timeout_wins": 0,
-        "timeout_losses": 0,
-        "opponent_rating_sum": 0,
-        "opponent_rating_count": 0,
-        "opponent_by_speed": {
-            "bullet": {"sum": 0, "count": 0},
-            "blitz": {"sum": 0, "count": 0},
-            "rapid": {"sum": 0, "count": 0},
-            "classical": {"sum": 0, "count": 0},
-        },
-        "opponent_hist": {},
-        "top_wins": [],  # list of tuples (rating, name, game_id)
-        "month_counts": [0] * 12,
-        "wday_counts": [0] * 7,
-        "hour_counts": [0] * 24,
-        "longest_win_streak": 0,
-        "longest_loss_streak": 0,
-        "longest_gap_ms": 0,
-    }
+        headers["Authorization"] = f"Bearer {token}"
+
+    stats = GameStats()
 
-    timeline: list[tuple[int, str]] = []
-    timestamps: list[int] = []
-    username_lower = username.lower()
+    # One typed column per per-game field; the reduction happens in _aggregate.
+    columns = _new_columns()
+    top_wins_heap = columns.pop("top_wins")
+    total = 0
     try:
-        with urllib.request.urlopen(request) as response:
-            for raw_line in response:
-                if not raw_line.strip():
-                    continue
-                stats["total"] = int(stats["total"]) + 1
-                try:
-                    game = json.loads(raw_line.decode("utf-8"))
-                except (UnicodeDecodeError, json.JSONDecodeError):
-                    continue  # skip malformed lines while keeping total count
-
-                ts = game.get("createdAt") or game.get("lastMoveAt")
-                if isinstance(ts, int):
-                    timestamps.append(ts)
-                    dt_obj = dt.datetime.fromtimestamp(ts / 1000, dt.timezone.utc)
-                    stats["month_counts"][dt_obj.month - 1] += 1
-                    stats["wday_counts"][dt_obj.weekday()] += 1
-                    stats["hour_counts"][dt_obj.hour] += 1
-
-                speed = game.get("speed")
-                if speed in stats["speed_counts"]:
-                    stats["speed_counts"][speed] += 1
-                else:
-                    stats["other_speeds"] = int(stats["other_speeds"]) + 1
-
-                players = game.get("players", {})
-                white = players.get("white", {})
-                black = players.get("black", {})
-                user_color = None
-                opp_color = None
-                white_id = (white.get("user") or {}).get("id", "").lower()
-                black_id = (black.get("user") or {}).get("id", "").lower()
-                if white_id == username_lower:
-                    user_color = "white"
-                    opp_color = "black"
-                elif black_id == username_lower:
-                    user_color = "black"
-                    opp_color = "white"
-
-                status = str(game.get("status", "")).lower()
-                winner = game.get("winner")
-
-                is_draw_status = status in {
-                    "draw",
-                    "stalemate",
-                    "repetition",
-                    "50move",
-                    "timevsinsufficientmaterial",
-                    "insufficientmaterial",
-                    "agreed",
-                }
-
-                outcome = None
-                if user_color:
-                    if winner == user_color:
-                        outcome = "win"
-                    elif winner in ("white", "black"):
-                        outcome = "loss"
-                    elif is_draw_status or winner is None:
-                        outcome = "draw"
-                    else:
-                        outcome = "draw"
-
-                    stats["results"][outcome] += 1
-                    stats["color_results"][user_color][outcome] += 1
-
-                    timeline.append((ts or 0, outcome))
-
-                if status:
-                    key = status if status in stats["endings"] else "other"
-                    stats["endings"][key] = int(stats["endings"][key]) + 1
-                    if status in ("timeout", "outoftime"):
-                        if outcome == "win":
-                            stats["timeout_wins"] += 1
-                        elif outcome == "loss":
-                            stats["timeout_losses"] += 1
-
-                if user_color and opp_color:
-                    opp_player = black if opp_color == "black" else white
-                    opp_rating = opp_player.get("rating")
-                    if isinstance(opp_rating, int):
-                        stats["opponent_rating_sum"] += opp_rating
-                        stats["opponent_rating_count"] += 1
-                        if speed in stats["opponent_by_speed"]:
-                            stats["opponent_by_speed"][speed]["sum"] += opp_rating
-                            stats["opponent_by_speed"][speed]["count"] += 1
-                        bucket = (opp_rating // 100) * 100
-                        hist = stats["opponent_hist"]
-                        hist[bucket] = hist.get(bucket, 0) + 1
-                        if outcome == "win":
-                            opp_name = (opp_player.get("user") or {}).get("name") or "?"
-                            stats["top_wins"].append((opp_rating, opp_name, game.get("id")))
-                            stats["top_wins"].sort(key=lambda t: t[0], reverse=True)
-                            if len(stats["top_wins"]) > 3:
-                                stats["top_wins"].pop()
+        with _lichess_get(url, headers) as response:
+            lines = _iter_ndjson_lines(_decoded_body(response))
+            for batch in _parse_in_batches(lines, username.lower()):
+                total += batch["total"]
+                for name, column in columns.items():
+                    column.extend(batch[name])
+                for entry in batch["top_wins"]:
+                    _push_top_win(top_wins_heap, entry)
     except urllib.error.HTTPError as exc:
         raise RuntimeError(f"Lichess API returned HTTP {exc.code}: {exc.reason}") from exc
     except urllib.error.URLError as exc:
         raise RuntimeError(f"Request to Lichess failed: {exc.reason}") from exc
 
-    if timeline:
-        timeline.sort(key=lambda x: x[0])
-        longest_win = longest_loss = 0
-        current_win = current_loss = 0
-        for _, outcome in timeline:
-            if outcome == "win":
-                current_win += 1
-                current_loss = 0
-            elif outcome == "loss":
-                current_loss += 1
-                current_win = 0
-            else:
-                current_win = 0
-                current_loss = 0
-            longest_win = max(longest_win, current_win)
-            longest_loss = max(longest_loss, current_loss)
-        stats["longest_win_streak"] = longest_win
-        stats["longest_loss_streak"] = longest_loss
+    stats.total = total
+    stats.top_wins = [
+        (rating, name, gid) for rating, _, name, gid in sorted(top_wins_heap, reverse=True)
+    ]
+    _aggregate(stats, year, **columns)
+    return stats
 
-    if len(timestamps) > 1:
-        timestamps.sort()
-        gaps = [timestamps[i] - timestamps[i - 1] for i in range(1, len(timestamps))]
-        stats["longest_gap_ms"] = max(gaps)
 
-    return stats
+def _aggregate(
+    stats: GameStats,
+    year: int,
+    speed_ids: array.array,
+    color_ids: array.array,
+    outcome_ids: array.array,
+    ending_ids: array.array,
+    opp_ratings: array.array,
+    ts_ms: array.array,
+) -> None:
+    """Reduce the per-game columns collected by fetch_game_stats into ``stats`` in place."""
+    speed_hist = collections.Counter(speed_ids)
+    stats.speed_counts = SpeedCounts(*(speed_hist[i] for i in range(len(_SPEEDS))))
+    stats.other_speeds = speed_hist[_OTHER_SPEED]
+
+    # Each Counter below is one C-level pass over the columns; the Python loops that
+    # follow only walk the few distinct keys instead of every game.
+    white = {1: 0, -1: 0, 0: 0}  # outcome code -> games
+    black = {1: 0, -1: 0, 0: 0}
+    ending_counts = [0] * len(_ENDINGS)
+    for (color_id, code, ending_id), count in collections.Counter(
+        zip(color_ids, outcome_ids, ending_ids)
+    ).items():
+        if ending_id != _NO_ENDING:
+            ending_counts[ending_id] += count
+        if color_id == _NO_COLOR:
+            continue
+        if color_id == _COLOR_IDS["white"]:
+            white[code] += count
+        else:
+            black[code] += count
+        if ending_id in _TIMEOUT_ENDINGS:
+            if code == 1:
+                stats.timeout_wins += count
+            elif code == -1:
+                stats.timeout_losses += count
+    stats.endings = Endings(*ending_counts)
+    stats.color_results = ColorResults(
+        white=Results(win=white[1], loss=white[-1], draw=white[0]),
+        black=Results(win=black[1], loss=black[-1], draw=black[0]),
+    )
+    stats.results = Results(
+        win=white[1] + black[1], loss=white[-1] + black[-1], draw=white[0] + black[0]
+    )
+
+    rating_sums = [0] * (_OTHER_SPEED + 1)
+    rating_counts = [0] * (_OTHER_SPEED + 1)
+    hist = [0] * _HIST_BUCKETS
+    top_bucket = _HIST_BUCKETS - 1
+    for (speed_id, rating), count in collections.Counter(zip(speed_ids, opp_ratings)).items():
+        if rating:
+            rating_sums[speed_id] += rating * count
+            rating_counts[speed_id] += count
+            hist[min(rating // 100, top_bucket)] += count
+    stats.opponent_rating_sum = sum(rating_sums)
+    stats.opponent_rating_count = sum(rating_counts)
+    stats.opponent_by_speed = OpponentBySpeed(
+        *(RatingTotal(rating_sums[i], rating_counts[i]) for i in range(len(_SPEEDS)))
+    )
+    stats.opponent_hist = {i * 100: count for i, count in enumerate(hist) if count}
+
+    timestamps = array.array("q", sorted(filter(None, ts_ms)))
+    month_counts = stats.month_counts
+    wday_counts = stats.wday_counts
+    hour_counts = stats.hour_counts
+    # Timestamps are sorted, so each month is a bisect-delimited slice.
+    month_starts = _month_starts_ms(year)
+    bounds = [bisect.bisect_left(timestamps, start) for start in month_starts]
+    for month in range(12):
+        month_counts[month] = bounds[month + 1] - bounds[month]
+    for ts in timestamps[:bounds[0]] + timestamps[bounds[12]:]:
+        month_counts[dt.datetime.fromtimestamp(ts / 1000, dt.timezone.utc).month - 1] += 1
+    # A year has under 9000 distinct epoch hours; fold those into hour-of-day and weekday.
+    for epoch_hour, count in collections.Counter(ts // 3_600_000 for ts in timestamps).items():
+        hour_counts[epoch_hour % 24] += count
+        wday_counts[(epoch_hour // 24 + 3) % 7] += count  # 1970-01-01 was a Thursday
+
+    played = [i for i, color_id in enumerate(color_ids) if color_id != _NO_COLOR]
+    if played:
+        played.sort(key=lambda i: ts_ms[i])
+        timeline = array.array("b", [outcome_ids[i] for i in played])
+        longest_win, longest_loss = _longest_streaks(timeline)
+        stats.longest_win_streak = longest_win
+        stats.longest_loss_streak = longest_loss
+
+    if len(timestamps) > 1:
+        stats.longest_gap_ms = max(b - a for a, b in zip(timestamps, timestamps[1:]))
 
 
 def parse_args(argv: list[str]) -> argparse.Namespace:
@@ -246,21 +583,17 @@ def fetch_puzzle_stats(username: str, year: int, token: Optional[str]) -> Option
 
     result: dict[str, object] = {}
     since_ms, until_ms = _year_bounds_ms(year)
-    activity_url = f"https://lichess.org/api/puzzle/activity?since={since_ms}&until={until_ms}"
-    activity_req = urllib.request.Request(activity_url)
-    activity_req.add_header("Accept", "application/x-ndjson")
-    activity_req.add_header("Authorization", f"Bearer {token}")
-    attempts = 0
+    query = urllib.parse.urlencode({"since": since_ms, "until": until_ms})
+    activity_url = f"{LICHESS_PUZZLE_ACTIVITY}?{query}"
+    headers = {
+        "Accept": "application/x-ndjson",
+        "Accept-Encoding": "gzip",
+        "Authorization": f"Bearer {token}",
+    }
     try:
-        with urllib.request.urlopen(activity_req) as resp:
-            for raw in resp:
-                if not raw.strip():
-                    continue
-                try:
-                    json.loads(raw.decode("utf-8"))
-                except (UnicodeDecodeError, json.JSONDecodeError):
-                    continue
-                attempts += 1
+        with _lichess_get(activity_url, headers) as resp:
+            # One NDJSON record per attempt; only the count is needed, so skip parsing.
+            attempts = sum(1 for _ in _iter_ndjson_lines(_decoded_body(resp)))
         result["attempts"] = attempts
     except urllib.error.HTTPError:
         if result:
@@ -285,93 +618,99 @@ def main(argv: list[str]) -> int:
         print(f"Error: {exc}", file=sys.stderr)
         return 1
 
-    total = stats["total"]
-    speed_counts = stats["speed_counts"]
-    print(f"{username} played {total} games in {args.year}.")
-    print("Breakdown by speed:")
-    print(f"  Bullet:     {speed_counts['bullet']}")
-    print(f"  Blitz:      {speed_counts['blitz']}")
-    print(f"  Rapid:      {speed_counts['rapid']}")
-    print(f"  Classical:  {speed_counts['classical']}")
-    if stats["other_speeds"]:
-        print(f"  Other:      {stats['other_speeds']}")
-
-    wins = stats["results"]["win"]
-    draws = stats["results"]["draw"]
-    losses = stats["results"]["loss"]
-    print("\nResults:")
-    print(f"  Wins/Draws/Losses: {wins}/{draws}/{losses}")
-    cr_white = stats["color_results"]["white"]
-    cr_black = stats["color_results"]["black"]
+    out = io.StringIO()
+    total = stats.total
+    speed_counts = stats.speed_counts
+    print(f"{username} played {total} games in {args.year}.", file=out)
+    print("Breakdown by speed:", file=out)
+    print(f"  Bullet:     {speed_counts.bullet}", file=out)
+    print(f"  Blitz:      {speed_counts.blitz}", file=out)
+    print(f"  Rapid:      {speed_counts.rapid}", file=out)
+    print(f"  Classical:  {speed_counts.classical}", file=out)
+    if stats.other_speeds:
+        print(f"  Other:      {stats.other_speeds}", file=out)
+
+    wins = stats.results.win
+    draws = stats.results.draw
+    losses = stats.results.loss
+    print("\nResults:", file=out)
+    print(f"  Wins/Draws/Losses: {wins}/{draws}/{losses}", file=out)
+    cr_white = stats.color_results.white
+    cr_black = stats.color_results.black
     print(
-        f"  As White (W/D/L): {cr_white['win']}/{cr_white['draw']}/{cr_white['loss']}   "
-        f"As Black (W/D/L): {cr_black['win']}/{cr_black['draw']}/{cr_black['loss']}"
+        f"  As White (W/D/L): {cr_white.win}/{cr_white.draw}/{cr_white.loss}   "
+        f"As Black (W/D/L): {cr_black.win}/{cr_black.draw}/{cr_black.loss}",
+        file=out,
     )
     print(
-        f"  Longest streaks - Win: {stats['longest_win_streak']} | "
-        f"Loss: {stats['longest_loss_streak']}"
+        f"  Longest streaks - Win: {stats.longest_win_streak} | "
+        f"Loss: {stats.longest_loss_streak}",
+        file=out,
     )
 
-    print("\nOpponent strength:")
+    print("\nOpponent strength:", file=out)
     per_speed_lines = []
-    for spd in ("bullet", "blitz", "rapid", "classical"):
-        s = stats["opponent_by_speed"][spd]
-        if s["count"]:
-            per_speed_lines.append(f"{spd} {s['sum']/s['count']:.1f} ({s['count']})")
+    obs = stats.opponent_by_speed
+    for spd, s in zip(_SPEEDS, (obs.bullet, obs.blitz, obs.rapid, obs.classical)):
+        if s.count:
+            per_speed_lines.append(f"{spd} {s.sum/s.count:.1f} ({s.count})")
     if per_speed_lines:
-        print(f"  By speed: {', '.join(per_speed_lines)}")
+        print(f"  By speed: {', '.join(per_speed_lines)}", file=out)
     else:
-        print("  No rating data available")
-    hist_items = sorted(stats["opponent_hist"].items())
+        print("  No rating data available", file=out)
+    hist_items = sorted(stats.opponent_hist.items())
     if hist_items:
         buckets = ", ".join([f"{b}s:{c}" for b, c in hist_items])
-        print(f"  Rating buckets (per 100): {buckets}")
-    top_wins = stats["top_wins"]
+        print(f"  Rating buckets (per 100): {buckets}", file=out)
+    top_wins = stats.top_wins
     if top_wins:
-        print("  Top-3 highest rated wins:")
+        print("  Top-3 highest rated wins:", file=out)
         for rating, name, gid in top_wins:
-            print(f"    {rating} vs {name} (game {gid})")
+            print(f"    {rating} vs {name} (game {gid})", file=out)
 
     months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-    months_line = " ".join([f"{m}:{c}" for m, c in zip(months, stats["month_counts"])])
+    months_line = " ".join([f"{m}:{c}" for m, c in zip(months, stats.month_counts)])
     wdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    wday_line = " ".join([f"{wd}:{c}" for wd, c in zip(wdays, stats["wday_counts"])])
-    print("\nActivity:")
-    print(f"  Games per month: {months_line}")
-    print(f"  Games per weekday: {wday_line}")
-    if stats["longest_gap_ms"]:
-        gap_days = stats["longest_gap_ms"] / (1000 * 60 * 60 * 24)
-        print(f"  Longest inactivity: {gap_days:.2f} days")
-
-    endings = stats["endings"]
-    print("\nEndings (tactics-ish):")
+    wday_line = " ".join([f"{wd}:{c}" for wd, c in zip(wdays, stats.wday_counts)])
+    print("\nActivity:", file=out)
+    print(f"  Games per month: {months_line}", file=out)
+    print(f"  Games per weekday: {wday_line}", file=out)
+    if stats.longest_gap_ms:
+        gap_days = stats.longest_gap_ms / (1000 * 60 * 60 * 24)
+        print(f"  Longest inactivity: {gap_days:.2f} days", file=out)
+
+    endings = stats.endings
+    print("\nEndings (tactics-ish):", file=out)
     print(
-        f"  Mate: {endings['mate']} | Resign: {endings['resign']} | "
-        f"Stalemate: {endings['stalemate']} | Time out: {endings['timeout']} | "
-        f"Out of time: {endings['outoftime']} | Draw: {endings['draw']} | "
-        f"Aborted: {endings['aborted']}"
+        f"  Mate: {endings.mate} | Resign: {endings.resign} | "
+        f"Stalemate: {endings.stalemate} | Time out: {endings.timeout} | "
+        f"Out of time: {endings.outoftime} | Draw: {endings.draw} | "
+        f"Aborted: {endings.aborted}",
+        file=out,
     )
-    if endings.get("other"):
-        print(f"  Other endings: {endings['other']}")
-    if stats["timeout_wins"] or stats["timeout_losses"]:
+    if endings.other:
+        print(f"  Other endings: {endings.other}", file=out)
+    if stats.timeout_wins or stats.timeout_losses:
         print(
-            f"  Flag wins: {stats['timeout_wins']} | Flag losses: {stats['timeout_losses']}"
+            f"  Flag wins: {stats.timeout_wins} | Flag losses: {stats.timeout_losses}",
+            file=out,
         )
 
-    print("\nFair play-ish:")
-    print(f"  Aborted/expired games: {endings.get('aborted', 0)}")
+    print("\nFair play-ish:", file=out)
+    print(f"  Aborted/expired games: {endings.aborted}", file=out)
 
     if args.token:
         puzzle = fetch_puzzle_stats(username, args.year, args.token)
-        print("\nPuzzles (needs token):")
+        print("\nPuzzles (needs token):", file=out)
         if puzzle:
             attempts = puzzle.get("attempts")
             if attempts is not None:
-                print(f"  Puzzles attempted in {args.year}: {attempts}")
+                print(f"  Puzzles attempted in {args.year}: {attempts}", file=out)
             else:
-                print(f"  Puzzles attempted in {args.year}: not available")
+                print(f"  Puzzles attempted in {args.year}: not available", file=out)
         else:
-            print("  No puzzle data available (check token or activity).")
+            print("  No puzzle data available (check token or activity).", file=out)
+    sys.stdout.write(out.getvalue())
     return 0
 
 